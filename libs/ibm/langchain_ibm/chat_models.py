@@ -1,11 +1,18 @@
+from __future__ import annotations
+
+import copy
+import hashlib
 import json
 import logging
 import os
+from collections import OrderedDict
 from datetime import datetime
 from operator import itemgetter
+from types import FunctionType, MappingProxyType
 from typing import (
     Any,
     Callable,
+    ClassVar,
     Dict,
     Iterator,
     List,
@@ -19,8 +26,9 @@ from typing import (
     Union,
     cast,
 )
-import re
 import uuid
+import warnings
+import weakref
 
 from ibm_watsonx_ai import Credentials  # type: ignore
 from ibm_watsonx_ai.foundation_models import ModelInference  # type: ignore
@@ -48,7 +56,6 @@ from langchain_core.messages import (
     ToolCall,
     ToolMessage,
     ToolMessageChunk,
-    convert_to_messages,
 )
 from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
 from langchain_core.output_parsers.base import OutputParserLike
@@ -58,7 +65,13 @@ from langchain_core.output_parsers.openai_tools import (
 )
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_core.prompt_values import ChatPromptValue
-from langchain_core.pydantic_v1 import BaseModel, Field, SecretStr, root_validator
+from langchain_core.pydantic_v1 import (
+    BaseModel,
+    Field,
+    PrivateAttr,
+    SecretStr,
+    root_validator,
+)
 from langchain_core.runnables import Runnable, RunnableMap, RunnablePassthrough
 from langchain_core.tools import BaseTool
 from langchain_core.utils import convert_to_secret_str, get_from_dict_or_env
@@ -67,7 +80,7 @@ from langchain_core.utils.function_calling import (
     convert_to_openai_tool,
 )
 import json
-from jsonschema import validate, ValidationError
+from jsonschema import Draft7Validator
 
 from langchain_core.messages import (
     AIMessage,
@@ -95,65 +108,113 @@ TOOL_SCHEMA = {
     "required": ["name", "args"],
 }
 
+_TOOL_SCHEMA_JSON = json.dumps(TOOL_SCHEMA, separators=(",", ":"))
+
+_TOOL_CALL_VALIDATOR = Draft7Validator(TOOL_SCHEMA)
+
+# Instructions sent as a system message when tools are bound. The whitespace of
+# the static text is collapsed once here; per request only the JSON tool
+# descriptions are collapsed and formatted into it.
+_TOOL_PROMPT_TEMPLATE = " ".join(
+    f"""
+    Given the following functions, please respond with a JSON for a function call
+    with its proper arguments that best answers the given prompt.
+
+    %s
+
+    Tools should use the following format:
+    {_TOOL_SCHEMA_JSON}
+
+    Reminder:
+        -Required parameters MUST be specified
+        -Put the entire function call reply on one line
+        -ONLY use the function arguments provided in the tool description.
+        -Always use double quotes for keys and values in the JSON object such as
+        {{"name": "name of function", "args": {{"arg1": "value1", "arg2": "value2"}}}}
+        -If you do not need to use a tool or you have the answer then respond
+        directly to the user.
+        -When calling a function or tool do NOT include anything except for the
+        JSON string.
+    """.split()
+)
 
-def validate_tool_call_with_schema(data: str) -> bool:
+
+def _try_parse_json(data: str) -> Tuple[bool, Any]:
     """
-    Validates a JSON object against a given schema.
+    Parses a JSON string once.
 
     Args:
-        data: The JSON object to validate (can be a Python dictionary or a JSON string).
-        schema: The JSON schema to validate against (a Python dictionary).
+        data: The JSON string to parse.
 
     Returns:
-        True if the data is valid according to the schema, False otherwise.
+        A ``(True, parsed)`` tuple if the string is valid JSON, ``(False, None)``
+        otherwise.
     """
     try:
-        # If data is a JSON string, parse it into a dictionary
+        return True, json.loads(data)
+    except (json.JSONDecodeError, TypeError):
+        return False, None
 
-        if isinstance(data.strip(), str):
-            data = json.loads(data)
 
-        # Validate the data against the schema
-        validate(instance=data, schema=TOOL_SCHEMA)
-        return True
+def _try_normalize_tool_call(data: Any) -> Optional[List[Dict[str, Any]]]:
+    """
+    Parses and validates a tool call in a single step.
 
-    except (json.JSONDecodeError, ValidationError):
-        return False
+    Args:
+        data: The tool call, either a JSON string or an already parsed object. A
+            list holding a single tool call is unwrapped.
+
+    Returns:
+        A list with the tool call dictionary if it is valid according to the
+        schema, None otherwise.
+    """
+    if isinstance(data, str):
+        # Most responses are prose, which cannot be a JSON object or list, so
+        # check the first character before running the JSON decoder.
+        if data.lstrip()[:1] not in ("{", "["):
+            return None
+        is_json, data = _try_parse_json(data)
+        if not is_json:
+            return None
+    if isinstance(data, list):
+        if len(data) != 1:
+            return None
+        data = data[0]
+    if not _TOOL_CALL_VALIDATOR.is_valid(data):
+        return None
+    return [data]
+
+
+def validate_tool_call_with_schema(data: Union[str, Dict[str, Any]]) -> bool:
+    """
+    Validates a JSON object against a given schema.
+
+    Args:
+        data: The JSON object to validate (can be a Python dictionary or a JSON string).
+
+    Returns:
+        True if the data is valid according to the schema, False otherwise.
+    """
+    return _try_normalize_tool_call(data) is not None
 
 
 def _tool_calling(
-    raw_tool_calls: dict,
+    raw_tool_calls: List[Dict[str, Any]],
     call_id: str,
 ) -> BaseMessage:
-    """Convert a dictionary to a LangChain message.
+    """Convert a list of normalized tool calls to a LangChain message.
 
     Args:
-        tool_call: The dictionary.
+        raw_tool_calls: The tool calls returned by `_try_normalize_tool_call`.
         call_id: call id
-        tool_call_chunks: tool call chunks
 
     Returns:
         The LangChain message.
     """
-    content = ""
-    tool_calls = []
-
-    if isinstance(raw_tool_calls, str):
-        raw_tool_calls = json.loads(raw_tool_calls)
-    # Check if raw_tool_calls is a list and extract the dictionary if it is
-    if isinstance(raw_tool_calls, list):
-        if len(raw_tool_calls) == 1 and isinstance(raw_tool_calls[0], dict):
-            raw_tool_calls = raw_tool_calls[0]
-        else:
-            raise ValueError("Expected a list with a single dictionary element")
-    elif isinstance(raw_tool_calls, dict):
-        raw_tool_calls = [raw_tool_calls]
-
     for tool in raw_tool_calls:
-        tool.update({"id": call_id})
-        tool_calls.append(tool)
+        tool["id"] = call_id
 
-    return AIMessage(content=content, tool_calls=tool_calls)
+    return AIMessage(content="", tool_calls=raw_tool_calls)
 
 
 ## Process a message after it has been generated by the model
@@ -169,13 +230,69 @@ def _post_processing(_dict: Mapping[str, Any], call_id: str) -> BaseMessage:
     """
     raw_message = _dict.get("generated_text", "")
 
-    is_tool = validate_tool_call_with_schema(raw_message)
-
-    if is_tool:
-        return _tool_calling(raw_message, call_id)
+    tool_calls = _try_normalize_tool_call(raw_message)
+    if tool_calls:
+        return _tool_calling(tool_calls, call_id)
     return AIMessage(content=raw_message)
 
 
+def _chat_message_to_dict(message: ChatMessage) -> dict:
+    return {"role": message.role, "content": message.content}
+
+
+def _human_message_to_dict(message: HumanMessage) -> dict:
+    return {"role": "user", "content": message.content}
+
+
+def _ai_message_to_dict(message: AIMessage) -> dict:
+    message_dict = {"role": "assistant", "content": message.content}
+    if "function_call" in message.additional_kwargs:
+        message_dict["function_call"] = message.additional_kwargs["function_call"]
+        # If function call only, content is None not empty string
+        if message_dict["content"] == "":
+            message_dict["content"] = None
+    if "tool_calls" in message.additional_kwargs:
+        message_dict["tool_calls"] = message.additional_kwargs["tool_calls"]
+        # If tool calls only, content is None not empty string
+        if message_dict["content"] == "":
+            message_dict["content"] = None
+    if message.tool_calls:
+        message_dict["tool_calls"] = message.tool_calls
+    return message_dict
+
+
+def _system_message_to_dict(message: SystemMessage) -> dict:
+    return {"role": "system", "content": message.content}
+
+
+def _function_message_to_dict(message: FunctionMessage) -> dict:
+    return {
+        "role": "function",
+        "content": message.content,
+        "name": message.name,
+    }
+
+
+def _tool_message_to_dict(message: ToolMessage) -> dict:
+    return {
+        "role": "tool",
+        "content": message.content,
+        "tool_call_id": message.tool_call_id,
+    }
+
+
+# Maps a message class to the function converting it to a dictionary. Exact
+# types are resolved with a single lookup, subclasses fall back to walking the
+# table in order.
+_MESSAGE_TO_DICT_HANDLERS: Dict[Type[BaseMessage], Callable[[Any], dict]] = {
+    ChatMessage: _chat_message_to_dict,
+    HumanMessage: _human_message_to_dict,
+    AIMessage: _ai_message_to_dict,
+    SystemMessage: _system_message_to_dict,
+    FunctionMessage: _function_message_to_dict,
+    ToolMessage: _tool_message_to_dict,
+}
+
 
 def _convert_message_to_dict(message: BaseMessage) -> dict:
     """Convert a LangChain message to a dictionary.
@@ -186,47 +303,219 @@ def _convert_message_to_dict(message: BaseMessage) -> dict:
     Returns:
         The dictionary.
     """
+    handler = _MESSAGE_TO_DICT_HANDLERS.get(type(message))
+    if handler is None:
+        for message_type, message_handler in _MESSAGE_TO_DICT_HANDLERS.items():
+            if isinstance(message, message_type):
+                handler = message_handler
+                break
+        else:
+            raise TypeError(f"Got unknown type {message}")
 
-    if isinstance(message, ChatMessage):
-        message_dict = {"role": message.role, "content": message.content}
-    elif isinstance(message, HumanMessage):
-        message_dict = {"role": "user", "content": message.content}
-    elif isinstance(message, AIMessage):
-        message_dict = {"role": "assistant", "content": message.content}
-        if "function_call" in message.additional_kwargs:
-            message_dict["function_call"] = message.additional_kwargs["function_call"]
-            # If function call only, content is None not empty string
-            if message_dict["content"] == "":
-                message_dict["content"] = None
-        if "tool_calls" in message.additional_kwargs:
-            message_dict["tool_calls"] = message.additional_kwargs["tool_calls"]
-            # If tool calls only, content is None not empty string
-            if message_dict["content"] == "":
-                message_dict["content"] = None
-        if "message.tool_calls":
-            message_dict["tool_calls"] = message.tool_calls
-    elif isinstance(message, SystemMessage):
-        message_dict = {"role": "system", "content": message.content}
-    elif isinstance(message, FunctionMessage):
-        message_dict = {
-            "role": "function",
-            "content": message.content,
-            "name": message.name,
-        }
-    elif isinstance(message, ToolMessage):
-        message_dict = {
-            "role": "tool",
-            "content": message.content,
-            "tool_call_id": message.tool_call_id,
-        }
-    else:
-        raise TypeError(f"Got unknown type {message}")
+    message_dict = handler(message)
     if "name" in message.additional_kwargs:
         message_dict["name"] = message.additional_kwargs["name"]
 
     return message_dict
 
 
+# Per-model prompt templates, keyed by message role. Roles missing from a table
+# are formatted as user messages.
+_GRANITE_TEMPLATES = {
+    "system": "<|system|>\n%s\n\n",
+    "assistant": "<|assistant|>\n%s\n\n",
+    "function": "<|function|>\n%s\n\n",
+    "tool": "<|tool|>\n%s\n\n",
+}
+_GRANITE_USER_TEMPLATE = "<|user|>:\n%s\n\n"
+_GRANITE_ASSISTANT_PREFIX = "<|assistant|>\n"
+
+_LLAMA2_TEMPLATES = {
+    "system": "[INST] <<SYS>>\n%s<</SYS>>\n\n",
+    "assistant": "%s\n[INST]\n\n",
+}
+_LLAMA2_USER_TEMPLATE = "%s\n[/INST]\n"
+
+_LLAMA3_SYSTEM_TEMPLATE = (
+    "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n %s <|eot_id|>\n"
+)
+_LLAMA3_TEMPLATES = {
+    "system": _LLAMA3_SYSTEM_TEMPLATE,
+    "assistant": (
+        "<|begin_of_text|><|start_header_id|>assistant<|end_header_id|>\n"
+        " %s <|eot_id|>\n"
+    ),
+    "tool_call": _LLAMA3_SYSTEM_TEMPLATE,
+}
+_LLAMA3_USER_TEMPLATE = (
+    "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n %s <|eot_id|>\n"
+)
+_LLAMA3_ASSISTANT_PREFIX = "<|assistant|>\n"
+
+
+def _make_prompt_builder(
+    templates: Dict[str, str], user_template: str, suffix: str = ""
+) -> Callable[[List[Dict[str, Any]]], str]:
+    """Create a prompt builder for a model specific chat template.
+
+    Args:
+        templates: Templates keyed by message role.
+        user_template: Template for roles missing from ``templates``.
+        suffix: Text appended after the last message.
+
+    Returns:
+        A function formatting a list of message dictionaries into a prompt.
+    """
+
+    def build(messages: List[Dict[str, Any]]) -> str:
+        get_template = templates.get
+        parts = [
+            get_template(message["role"], user_template) % message["content"]
+            for message in messages
+        ]
+        parts.append(suffix)
+        return "".join(parts)
+
+    return build
+
+
+_build_granite_prompt = _make_prompt_builder(
+    _GRANITE_TEMPLATES, _GRANITE_USER_TEMPLATE, _GRANITE_ASSISTANT_PREFIX
+)
+_build_llama2_prompt = _make_prompt_builder(_LLAMA2_TEMPLATES, _LLAMA2_USER_TEMPLATE)
+_build_llama3_prompt = _make_prompt_builder(
+    _LLAMA3_TEMPLATES, _LLAMA3_USER_TEMPLATE, _LLAMA3_ASSISTANT_PREFIX
+)
+
+# Prompt builder per model id. Models not listed are formatted with
+# `ChatPromptValue.to_string`.
+_PROMPT_BUILDERS: Dict[str, Callable[[List[Dict[str, Any]]], str]] = {
+    "ibm/granite-13b-chat-v1": _build_granite_prompt,
+    "ibm/granite-13b-chat-v2": _build_granite_prompt,
+    "meta-llama/llama-2-13b-chat": _build_llama2_prompt,
+    "meta-llama/llama-2-70b-chat": _build_llama2_prompt,
+    "meta-llama/llama-3-1-8b-instruct": _build_llama3_prompt,
+    "meta-llama/llama-3-1-70b-instruct": _build_llama3_prompt,
+}
+
+
+# `ModelInference` clients shared by `ChatWatsonx` instances created with the
+# same credentials and model configuration. Building a client authenticates
+# against the service, so it is only done once per configuration. Entries are
+# weak so a client is dropped with the last instance using it, and the
+# credentials are only kept as a digest in the key. Set the
+# `WATSONX_DISABLE_MODEL_CACHE=1` environment variable to always build a new one.
+_MODEL_CACHE: weakref.WeakValueDictionary[Tuple[Any, ...], ModelInference] = (
+    weakref.WeakValueDictionary()
+)
+
+
+_STRUCTURED_OUTPUT_CACHE_SIZE = 32
+
+
+def _get_tool_prompt(tools: Sequence[Dict[str, Any]]) -> str:
+    """Get the tool prompt for a list of tools in the OpenAI format.
+
+    Args:
+        tools: The tools bound to the chat model.
+
+    Returns:
+        The system prompt describing the tools.
+    """
+    tool_descriptions = [
+        {
+            "name": function["name"],
+            "description": function["description"],
+            "args": function["parameters"]["properties"],
+        }
+        for function in (tool["function"] for tool in tools)
+    ]
+    # `json.dumps` escapes newlines and tabs but keeps runs of spaces inside the
+    # descriptions, so they are collapsed like the rest of the prompt.
+    tool_descriptions_json = json.dumps(
+        tool_descriptions, ensure_ascii=False, separators=(",", ":")
+    )
+    return _TOOL_PROMPT_TEMPLATE % " ".join(tool_descriptions_json.split())
+
+
+# Read-only, so the same mapping can be returned by every `lc_secrets` access.
+_LC_SECRETS: Mapping[str, str] = MappingProxyType(
+    {
+        "url": "WATSONX_URL",
+        "apikey": "WATSONX_APIKEY",
+        "token": "WATSONX_TOKEN",
+        "password": "WATSONX_PASSWORD",
+        "username": "WATSONX_USERNAME",
+        "instance_id": "WATSONX_INSTANCE_ID",
+    }
+)
+
+
+# OpenAI tool definitions of classes, such as pydantic models, and functions. These
+# are not expected to change once defined. Entries live only as long as their
+# tool, so bound tools are not kept alive by the cache. Dicts are converted on
+# every call.
+_TOOL_CACHE: weakref.WeakKeyDictionary[Any, Dict[str, Any]] = (
+    weakref.WeakKeyDictionary()
+)
+
+# OpenAI tool definitions of `BaseTool` instances, which cannot be hashed, keyed by
+# `id`. Tools can be changed after they are created, so each definition is stored
+# with the attributes it was built from and rebuilt when they differ. An entry is
+# dropped as soon as its tool is garbage collected, so a cached `id` is never
+# reused by another object.
+_BASE_TOOL_CACHE: Dict[int, Tuple[Tuple[Any, ...], Dict[str, Any]]] = {}
+
+
+def _convert_to_openai_tool_cached(tool: Any) -> Dict[str, Any]:
+    """Convert a tool to the OpenAI tool format, reusing earlier conversions.
+
+    Args:
+        tool: A dictionary, pydantic model, callable or `BaseTool`.
+
+    Returns:
+        The tool definition in the OpenAI format. Cached definitions are copied,
+        so the returned dictionary can be changed by the caller.
+    """
+    if isinstance(tool, BaseTool):
+        return _convert_base_tool_cached(tool)
+    if not isinstance(tool, (type, FunctionType)):
+        return convert_to_openai_tool(tool)
+
+    formatted_tool = _TOOL_CACHE.get(tool)
+    if formatted_tool is None:
+        formatted_tool = convert_to_openai_tool(tool)
+        _TOOL_CACHE[tool] = formatted_tool
+    return copy.deepcopy(formatted_tool)
+
+
+def _convert_base_tool_cached(tool: BaseTool) -> Dict[str, Any]:
+    # The conversion only reads these. Without an `args_schema` the arguments
+    # come from the `_run` signature of the tool's class.
+    source = (type(tool), tool.name, tool.description, tool.args_schema)
+    key = id(tool)
+    cached = _BASE_TOOL_CACHE.get(key)
+    if cached is not None and cached[0] == source:
+        return copy.deepcopy(cached[1])
+
+    formatted_tool = convert_to_openai_tool(tool)
+    if cached is None:
+        weakref.finalize(tool, _BASE_TOOL_CACHE.pop, key, None)
+    _BASE_TOOL_CACHE[key] = (source, formatted_tool)
+    return copy.deepcopy(formatted_tool)
+
+
+_BIND_TOOLS_SUPPORTED_MODELS = frozenset(
+    {
+        "ibm/granite-20b-code-instruct",
+        "ibm/granite-13b-chat-v2",
+        "ibm/granite-13b-instruct-v2",
+        "meta-llama/llama-3-1-8b-instruct",
+        "meta-llama/llama-3-1-70b-instruct",
+    }
+)
+
+
 class _FunctionCall(TypedDict):
     name: str
 
@@ -311,6 +600,15 @@ class ChatWatsonx(BaseChatModel):
 
     watsonx_model: ModelInference = Field(default=None, exclude=True)  #: :meta private:
 
+    _structured_output_cache: OrderedDict[
+        Tuple[int, Type[BaseModel], str, bool],
+        Runnable[LanguageModelInput, Union[Dict, BaseModel]],
+    ] = PrivateAttr(default_factory=OrderedDict)
+    """Runnables returned by `with_structured_output` for pydantic schemas, keyed
+    by the instance, schema, method and include_raw. Only the most recently used
+    `_STRUCTURED_OUTPUT_CACHE_SIZE` entries are kept. Dict schemas can be changed
+    in place, so they are never cached."""
+
     class Config:
         """Configuration for this pydantic object."""
 
@@ -348,14 +646,7 @@ class ChatWatsonx(BaseChatModel):
                 "instance_id": "WATSONX_INSTANCE_ID",
             }
         """
-        return {
-            "url": "WATSONX_URL",
-            "apikey": "WATSONX_APIKEY",
-            "token": "WATSONX_TOKEN",
-            "password": "WATSONX_PASSWORD",
-            "username": "WATSONX_USERNAME",
-            "instance_id": "WATSONX_INSTANCE_ID",
-        }
+        return cast(Dict[str, str], _LC_SECRETS)
 
     @root_validator()
     def validate_environment(cls, values: Dict) -> Dict:
@@ -406,87 +697,68 @@ class ChatWatsonx(BaseChatModel):
                 values["instance_id"] = convert_to_secret_str(
                     get_from_dict_or_env(values, "instance_id", "WATSONX_INSTANCE_ID")
                 )
-        credentials = Credentials(
-            url=values["url"].get_secret_value() if values["url"] else None,
-            api_key=values["apikey"].get_secret_value() if values["apikey"] else None,
-            token=values["token"].get_secret_value() if values["token"] else None,
-            password=(
-                values["password"].get_secret_value() if values["password"] else None
-            ),
-            username=(
-                values["username"].get_secret_value() if values["username"] else None
-            ),
-            instance_id=(
-                values["instance_id"].get_secret_value()
-                if values["instance_id"]
-                else None
+        secrets = tuple(
+            values[key].get_secret_value() if values[key] else None
+            for key in (
+                "url",
+                "apikey",
+                "token",
+                "password",
+                "username",
+                "instance_id",
+                "version",
+            )
+        )
+        cache_key = (
+            hashlib.sha256(json.dumps(secrets).encode()).hexdigest(),
+            values["verify"],
+            values["model_id"],
+            values["deployment_id"],
+            values["project_id"],
+            values["space_id"],
+            (
+                json.dumps(values["params"], sort_keys=True, default=str)
+                if values["params"]
+                else ""
             ),
-            version=values["version"].get_secret_value() if values["version"] else None,
-            verify=values["verify"],
         )
+        use_cache = os.environ.get("WATSONX_DISABLE_MODEL_CACHE") != "1"
+
+        watsonx_chat = _MODEL_CACHE.get(cache_key) if use_cache else None
+        if watsonx_chat is None:
+            url, apikey, token, password, username, instance_id, version = secrets
+            credentials = Credentials(
+                url=url,
+                api_key=apikey,
+                token=token,
+                password=password,
+                username=username,
+                instance_id=instance_id,
+                version=version,
+                verify=values["verify"],
+            )
 
-        watsonx_chat = ModelInference(
-            model_id=values["model_id"],
-            deployment_id=values["deployment_id"],
-            credentials=credentials,
-            params=values["params"],
-            project_id=values["project_id"],
-            space_id=values["space_id"],
-        )
+            watsonx_chat = ModelInference(
+                model_id=values["model_id"],
+                deployment_id=values["deployment_id"],
+                credentials=credentials,
+                params=values["params"],
+                project_id=values["project_id"],
+                space_id=values["space_id"],
+            )
+            if use_cache:
+                _MODEL_CACHE[cache_key] = watsonx_chat
         values["watsonx_model"] = watsonx_chat
 
         return values
 
-    def _create_chat_prompt(self, messages: List[Dict[str, Any]]) -> str:
-        prompt = ""
-
-        if self.model_id in ["ibm/granite-13b-chat-v1", "ibm/granite-13b-chat-v2"]:
-            for message in messages:
-                if message["role"] == "system":
-                    prompt += "<|system|>\n" + message["content"] + "\n\n"
-                elif message["role"] == "assistant":
-                    prompt += "<|assistant|>\n" + message["content"] + "\n\n"
-                elif message["role"] == "function":
-                    prompt += "<|function|>\n" + message["content"] + "\n\n"
-                elif message["role"] == "tool":
-                    prompt += "<|tool|>\n" + message["content"] + "\n\n"
-                else:
-                    prompt += "<|user|>:\n" + message["content"] + "\n\n"
-
-            prompt += "<|assistant|>\n"
-
-        elif self.model_id in [
-            "meta-llama/llama-2-13b-chat",
-            "meta-llama/llama-2-70b-chat",
-        ]:
-            for message in messages:
-                if message["role"] == "system":
-                    prompt += "[INST] <<SYS>>\n" + message["content"] + "<</SYS>>\n\n"
-                elif message["role"] == "assistant":
-                    prompt += message["content"] + "\n[INST]\n\n"
-                else:
-                    prompt += message["content"] + "\n[/INST]\n"
-
-        elif self.model_id in ["meta-llama/llama-3-1-8b-instruct", "meta-llama/llama-3-1-70b-instruct"]:
-            for message in messages:
-                if message["role"] == "system":
-                    prompt += f"<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n {message['content']} <|eot_id|>\n"
-                elif message["role"] == "assistant":
-                    (
-                        prompt
-                        + f"<|begin_of_text|><|start_header_id|>assistant<|end_header_id|>\n {message['content']} <|eot_id|>\n"
-                    )
-                elif message["role"] == "tool_call":
-                    prompt += f"<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n {message['content']} <|eot_id|>\n"
-                else:
-                    prompt += f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n {message['content']} <|eot_id|>\n"
-            prompt += "<|assistant|>\n"
-        else:
-            prompt = ChatPromptValue(
-                messages=convert_to_messages(messages) + [AIMessage(content="")]
+    def _create_chat_prompt(self, messages: List[BaseMessage]) -> str:
+        builder = _PROMPT_BUILDERS.get(self.model_id)
+        if builder is None:
+            return ChatPromptValue(
+                messages=[*messages, AIMessage(content="")]
             ).to_string()
-
-        return prompt
+        return builder(list(map(_convert_message_to_dict, messages)))
 
     def _get_payload(
         self, inputs: Sequence[Dict], params: Sequence[Dict], **kwargs: Any
@@ -517,58 +789,33 @@ class ChatWatsonx(BaseChatModel):
         **kwargs: Any,
     ) -> ChatResult:
 
-        prompts = []
-        system_message = ""
-        message_dicts, params = self._create_message_dicts(messages, stop, **kwargs)
-        chat_messages = []
-        chat_messages.extend([m for m in message_dicts])
+        params = self._create_params(stop, **kwargs)
+
+        # There could be multiple System prompts such as the prompt that is created at
+        # runtime of the user application to give a persona to the LLM. Additionally, we
+        # need to add the tool prompt as the system prompt. Below we are splitting the
+        # system prompts, including chat messages with the "system" role, from the other
+        # messages in a single pass so they can be combined.
+        system_parts: List[str] = []
+        chat_messages: List[BaseMessage] = []
+        for message in messages:
+            if isinstance(message, SystemMessage) or (
+                isinstance(message, ChatMessage) and message.role == "system"
+            ):
+                system_parts.append(cast(str, message.content))
+            else:
+                chat_messages.append(message)
 
-        tools = kwargs.get("tools")
+        tools = kwargs.pop("tools", None)
+        kwargs.pop("tool_choice", None)
 
         ## CREATING TOOL PROMPT
         if tools:
-            tool_descriptions = []
-            for tool in tools:
-                function_call = tool.get("function")
-                args = function_call["parameters"]["properties"]
-                tool_description = {
-                    "name": function_call["name"],
-                    "description": function_call["description"],
-                    "args": args,
-                }
-
-                tool_descriptions.append(tool_description)
-
-            tool_prompt = f"""Given the following functions, please respond with a JSON for a function call with its proper arguments that best answers the given prompt.\n
-
-            {tool_descriptions}\n
-
-            Tools should use the following format:\n
-            {TOOL_SCHEMA}
-
-            Reminder:
-                -Required parameters MUST be specified\
-                -Put the entire function call reply on one line\
-                -ONLY use the function arguments provided in the tool description.\
-                -Always use double quotes for keys and values in the JSON object such as {{"name": "name of function", "args": {{"arg1": "value1", "arg2": "value2"}}}}\
-                -If you do not need to use a tool or you have the answer then respond directly to the user.\
-                -When calling a function or tool do NOT include anything except for the JSON string.\
-            """
-
-            # If tools are present we add the tool prompt to the chat_messages so it can be combined with the other system messages.
-            chat_messages.append({"role": "system", "content": re.sub(r"\s+", " ", tool_prompt).strip()})
-
-            if "tools" in kwargs:
-                del kwargs["tools"]
-            if "tool_choice" in kwargs:
-                del kwargs["tool_choice"]
+            # If tools are present we add the tool prompt to the system prompts so it
+            # can be combined with them.
+            system_parts.append(_get_tool_prompt(tools))
 
-
-        # There could be multiple System prompts such as the prompt that is created at runtime of the
-        # user application to give a persona to the LLM. Additionally, we need to add the tool prompt
-        # as the system prompt. Below we are extracting all of the system prompts to combined them.
-        system_message = "".join(message["content"] for message in chat_messages if message.get("role") == "system")
-        prompts = [{"role": "system", "content": system_message}] + [message for message in chat_messages if message.get("role") != "system"]
+        prompts = [SystemMessage(content="\n".join(system_parts)), *chat_messages]
 
         formatted_messages = self._create_chat_prompt(prompts) # Formats the prompts to be sent to the model.
         response = self.watsonx_model.generate(prompt=formatted_messages, **(kwargs | {"params": params}))
@@ -576,9 +823,9 @@ class ChatWatsonx(BaseChatModel):
         #### POST PROCESSING AFTER RECEIVING RESPONSE FROM LLM ####
         return self._create_chat_result(response)
 
-    def _create_message_dicts(
-        self, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs: Any
-    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    def _create_params(
+        self, stop: Optional[List[str]], **kwargs: Any
+    ) -> Dict[str, Any]:
         params = {**self.params} if self.params else {}
         params = params | {**kwargs.get("params", {})}
         if stop is not None:
@@ -587,11 +834,9 @@ class ChatWatsonx(BaseChatModel):
                     "`stop_sequences` found in both the input and default params."
                 )
             params = (params or {}) | {"stop_sequences": stop}
-        message_dicts = [_convert_message_to_dict(m) for m in messages]
-        return message_dicts, params
+        return params
 
     def _create_chat_result(self, response: Union[dict]) -> ChatResult:
-        generations = []
         sum_of_total_generated_tokens = 0
         sum_of_total_input_tokens = 0
         call_id = uuid.uuid4().hex
@@ -599,25 +844,28 @@ class ChatWatsonx(BaseChatModel):
         if response.get("error"):
             raise ValueError(response.get("error"))
 
+        generations = []
         for res in response["results"]:
-            message = _post_processing(res, call_id)
-            generation_info = dict(finish_reason=res.get("stop_reason"))
-            if "generated_token_count" in res:
-                sum_of_total_generated_tokens += res["generated_token_count"]
-            if "input_token_count" in res:
-                sum_of_total_input_tokens += res["input_token_count"]
-            total_token = sum_of_total_generated_tokens + sum_of_total_input_tokens
-            if total_token and isinstance(message, AIMessage):
+            sum_of_total_generated_tokens += res.get("generated_token_count", 0)
+            sum_of_total_input_tokens += res.get("input_token_count", 0)
+            generations.append(
+                ChatGeneration(
+                    message=_post_processing(res, call_id),
+                    generation_info={"finish_reason": res.get("stop_reason")},
+                )
+            )
+
+        # The usage covers all results, so it is attached once to the last one.
+        total_token = sum_of_total_generated_tokens + sum_of_total_input_tokens
+        if total_token and generations:
+            message = generations[-1].message
+            if isinstance(message, AIMessage):
                 message.usage_metadata = {
                     "input_tokens": sum_of_total_input_tokens,
                     "output_tokens": sum_of_total_generated_tokens,
                     "total_tokens": total_token,
                 }
-            gen = ChatGeneration(
-                message=message,
-                generation_info=generation_info,
-            )
-            generations.append(gen)
+
         token_usage = {
             "generated_token_count": sum_of_total_generated_tokens,
             "input_token_count": sum_of_total_input_tokens,
@@ -665,15 +913,24 @@ class ChatWatsonx(BaseChatModel):
         ] = None,
         **kwargs: Any,
     ) -> Runnable[LanguageModelInput, BaseMessage]:
-        bind_tools_supported_models = ["ibm/granite-20b-code-instruct", "ibm/granite-13b-chat-v2", "ibm/granite-13b-instruct-v2", "meta-llama/llama-3-1-8b-instruct", "meta-llama/llama-3-1-70b-instruct"]
+        self._warn_if_bind_tools_unsupported(stacklevel=2)
+        formatted_tools = list(map(_convert_to_openai_tool_cached, tools))
+        return super().bind(tools=formatted_tools, **kwargs)
 
-        if self.model_id not in bind_tools_supported_models:
-            raise Warning(
+    def _warn_if_bind_tools_unsupported(self, stacklevel: int) -> None:
+        """Warn if the model does not support tools.
+
+        Args:
+            stacklevel: Passed to `warnings.warn` by the public method calling
+                this, so the warning points at the user's code.
+        """
+        if self.model_id not in _BIND_TOOLS_SUPPORTED_MODELS:
+            warnings.warn(
                 f"bind_tools() method for ChatWatsonx support only "
-                f"following models: {bind_tools_supported_models}"
+                f"following models: {sorted(_BIND_TOOLS_SUPPORTED_MODELS)}",
+                UserWarning,
+                stacklevel=stacklevel + 1,
             )
-        formatted_tools = [convert_to_openai_tool(tool) for tool in tools]
-        return super().bind(tools=formatted_tools, **kwargs)
 
     def with_structured_output(
         self,
@@ -685,37 +942,49 @@ class ChatWatsonx(BaseChatModel):
     ) -> Runnable[LanguageModelInput, Union[Dict, BaseModel]]:
         if kwargs:
             raise ValueError(f"Received unsupported arguments {kwargs}")
-        is_pydantic_schema = _is_pydantic_class(schema)
-        if method == "function_calling":
-            if schema is None:
-                raise ValueError(
-                    "schema must be specified when method is 'function_calling'. "
-                    "Received None."
-                )
-            llm = self.bind_tools([schema], tool_choice=True)
-            if is_pydantic_schema:
-                output_parser: OutputParserLike = PydanticToolsParser(
-                    tools=[schema],  # type: ignore[list-item]
-                    first_tool_only=True,  # type: ignore[list-item]
-                )
-            else:
-                key_name = convert_to_openai_tool(schema)["function"]["name"]
-                output_parser = JsonOutputKeyToolsParser(
-                    key_name=key_name, first_tool_only=True
-                )
-        elif method == "json_mode":
-            llm = self.bind(response_format={"type": "json_object"})
-            output_parser = (
-                PydanticOutputParser(pydantic_object=schema)  # type: ignore[type-var, arg-type]
-                if is_pydantic_schema
-                else JsonOutputParser()
-            )
-        else:
+        if method not in self._METHOD_DISPATCH:
             raise ValueError(
                 f"Unrecognized method argument. Expected one of 'function_calling' or "
-                f"'json_format'. Received: '{method}'"
+                f"'json_mode'. Received: '{method}'"
+            )
+        if method == "function_calling":
+            self._warn_if_bind_tools_unsupported(stacklevel=2)
+
+        if not _is_pydantic_class(schema):
+            return self._build_structured_output(
+                schema, method=method, include_raw=include_raw
             )
 
+        # The cache is shared by shallow copies of this model, so the key also
+        # includes the instance the runnable was built for. The runnable binds
+        # that instance, so its `id` is not reused while the entry is cached.
+        cache = self._structured_output_cache
+        cache_key = (id(self), cast(Type[BaseModel], schema), method, include_raw)
+        structured_llm = cache.pop(cache_key, None)
+        if structured_llm is None:
+            structured_llm = self._build_structured_output(
+                schema, method=method, include_raw=include_raw
+            )
+        cache[cache_key] = structured_llm
+        while len(cache) > _STRUCTURED_OUTPUT_CACHE_SIZE:
+            try:
+                cache.popitem(last=False)
+            except KeyError:
+                # Emptied by another thread.
+                break
+        return structured_llm
+
+    def _build_structured_output(
+        self,
+        schema: Optional[Union[Dict, Type[BaseModel]]],
+        *,
+        method: Literal["function_calling", "json_mode"],
+        include_raw: bool,
+    ) -> Runnable[LanguageModelInput, Union[Dict, BaseModel]]:
+        llm, output_parser = self._METHOD_DISPATCH[method](
+            self, schema, _is_pydantic_class(schema)
+        )
+
         if include_raw:
             parser_assign = RunnablePassthrough.assign(
                 parsed=itemgetter("raw") | output_parser, parsing_error=lambda _: None
@@ -728,6 +997,55 @@ class ChatWatsonx(BaseChatModel):
         else:
             return llm | output_parser
 
+    def _build_function_calling(
+        self, schema: Optional[Union[Dict, Type[BaseModel]]], is_pydantic_schema: bool
+    ) -> Tuple[Runnable[LanguageModelInput, BaseMessage], OutputParserLike]:
+        if schema is None:
+            raise ValueError(
+                "schema must be specified when method is 'function_calling'. "
+                "Received None."
+            )
+        # Convert the schema once, both to bind it and to get its name.
+        formatted_tool = _convert_to_openai_tool_cached(schema)
+        llm = self.bind(tools=[formatted_tool])
+        if is_pydantic_schema:
+            output_parser: OutputParserLike = PydanticToolsParser(
+                tools=[schema],  # type: ignore[list-item]
+                first_tool_only=True,  # type: ignore[list-item]
+            )
+        else:
+            key_name = formatted_tool["function"]["name"]
+            output_parser = JsonOutputKeyToolsParser(
+                key_name=key_name, first_tool_only=True
+            )
+        return llm, output_parser
+
+    def _build_json_mode(
+        self, schema: Optional[Union[Dict, Type[BaseModel]]], is_pydantic_schema: bool
+    ) -> Tuple[Runnable[LanguageModelInput, BaseMessage], OutputParserLike]:
+        llm = self.bind(response_format={"type": "json_object"})
+        output_parser = (
+            PydanticOutputParser(pydantic_object=schema)  # type: ignore[type-var, arg-type]
+            if is_pydantic_schema
+            else JsonOutputParser()
+        )
+        return llm, output_parser
+
+    # Builds the bound model and output parser for each `with_structured_output`
+    # method.
+    _METHOD_DISPATCH: ClassVar[
+        Dict[
+            str,
+            Callable[
+                ...,
+                Tuple[Runnable[LanguageModelInput, BaseMessage], OutputParserLike],
+            ],
+        ]
+    ] = {
+        "function_calling": _build_function_calling,
+        "json_mode": _build_json_mode,
+    }
+
 
 def _is_pydantic_class(obj: Any) -> bool:
     return isinstance(obj, type) and issubclass(obj, BaseModel)
@@ -1,8 +1,28 @@
 """Test ChatWatsonx API wrapper."""
 
+import gc
 import os
+import weakref
+from unittest.mock import MagicMock
 
-from langchain_ibm import ChatWatsonx
+import pytest
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    ChatMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.tools import tool
+
+from langchain_ibm import ChatWatsonx, chat_models
+from langchain_ibm.chat_models import (
+    _convert_message_to_dict,
+    _get_tool_prompt,
+    _post_processing,
+)
 
 os.environ.pop("WATSONX_APIKEY", None)
 os.environ.pop("WATSONX_PROJECT_ID", None)
@@ -60,3 +80,440 @@ def test_initialize_chat_watsonx_cpd_bad_path_apikey_without_username() -> None:
         )
     except ValueError as e:
         assert "WATSONX_USERNAME" in e.__str__()
+
+
+def test_post_processing_tool_call() -> None:
+    message = _post_processing(
+        {"generated_text": '{"name": "get_weather", "args": {"city": "Boston"}}'},
+        "call-id",
+    )
+    assert isinstance(message, AIMessage)
+    assert message.content == ""
+    assert message.tool_calls == [
+        {
+            "name": "get_weather",
+            "args": {"city": "Boston"},
+            "id": "call-id",
+            "type": "tool_call",
+        }
+    ]
+
+
+def test_post_processing_plain_text() -> None:
+    raw_message = "The weather in Boston is sunny."
+    message = _post_processing({"generated_text": raw_message}, "call-id")
+    assert isinstance(message, AIMessage)
+    assert message.content == raw_message
+    assert message.tool_calls == []
+
+
+def test_convert_message_to_dict() -> None:
+    assert _convert_message_to_dict(HumanMessage(content="Hi")) == {
+        "role": "user",
+        "content": "Hi",
+    }
+    assert _convert_message_to_dict(SystemMessage(content="Be brief")) == {
+        "role": "system",
+        "content": "Be brief",
+    }
+    assert _convert_message_to_dict(
+        ToolMessage(content="42", tool_call_id="call-id")
+    ) == {"role": "tool", "content": "42", "tool_call_id": "call-id"}
+    assert _convert_message_to_dict(ChatMessage(role="critic", content="Ok")) == {
+        "role": "critic",
+        "content": "Ok",
+    }
+
+
+def test_convert_message_to_dict_ai_message_without_tool_calls() -> None:
+    assert _convert_message_to_dict(AIMessage(content="Hello")) == {
+        "role": "assistant",
+        "content": "Hello",
+    }
+
+
+def test_convert_message_to_dict_subclass() -> None:
+    assert _convert_message_to_dict(AIMessageChunk(content="Hello")) == {
+        "role": "assistant",
+        "content": "Hello",
+    }
+
+
+def test_create_chat_prompt_llama_3_1_keeps_assistant_messages() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+    prompt = chat._create_chat_prompt(
+        [
+            SystemMessage(content="Be brief"),
+            HumanMessage(content="Hi"),
+            AIMessage(content="Hello"),
+        ]
+    )
+    assert prompt == (
+        "<|begin_of_text|><|start_header_id|>system<|end_header_id|>\n"
+        " Be brief <|eot_id|>\n"
+        "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n"
+        " Hi <|eot_id|>\n"
+        "<|begin_of_text|><|start_header_id|>assistant<|end_header_id|>\n"
+        " Hello <|eot_id|>\n"
+        "<|assistant|>\n"
+    )
+
+
+def test_generate_combines_system_messages_with_tool_prompt() -> None:
+    watsonx_model = MagicMock()
+    watsonx_model.generate.return_value = {
+        "results": [
+            {
+                "generated_text": "Hello",
+                "generated_token_count": 1,
+                "input_token_count": 5,
+                "stop_reason": "eos_token",
+            }
+        ]
+    }
+    chat = ChatWatsonx.construct(
+        model_id="ibm/granite-13b-chat-v2", watsonx_model=watsonx_model
+    )
+    tool = {
+        "type": "function",
+        "function": {
+            "name": "get_weather",
+            "description": "Get the weather",
+            "parameters": {"type": "object", "properties": {"city": {}}},
+        },
+    }
+
+    result = chat._generate(
+        [SystemMessage(content="Be brief"), HumanMessage(content="Hi")],
+        tools=[tool],
+        tool_choice="auto",
+    )
+
+    message = result.generations[0].message
+    assert isinstance(message, AIMessage)
+    assert message.content == "Hello"
+    assert message.usage_metadata == {
+        "input_tokens": 5,
+        "output_tokens": 1,
+        "total_tokens": 6,
+    }
+    call_kwargs = watsonx_model.generate.call_args.kwargs
+    assert "tools" not in call_kwargs and "tool_choice" not in call_kwargs
+    prompt = call_kwargs["prompt"]
+    assert prompt.startswith("<|system|>\nBe brief\nGiven the following functions")
+    assert '"name":"get_weather"' in prompt
+    assert prompt.endswith("<|user|>:\nHi\n\n<|assistant|>\n")
+
+
+def test_generate_combines_chat_messages_with_system_role() -> None:
+    watsonx_model = MagicMock()
+    watsonx_model.generate.return_value = {
+        "results": [
+            {
+                "generated_text": "Hello",
+                "generated_token_count": 1,
+                "input_token_count": 5,
+                "stop_reason": "eos_token",
+            }
+        ]
+    }
+    chat = ChatWatsonx.construct(
+        model_id="ibm/granite-13b-chat-v2", watsonx_model=watsonx_model
+    )
+
+    chat._generate(
+        [
+            SystemMessage(content="A"),
+            ChatMessage(role="system", content="B"),
+            HumanMessage(content="Hi"),
+        ]
+    )
+
+    prompt = watsonx_model.generate.call_args.kwargs["prompt"]
+    assert prompt == "<|system|>\nA\nB\n\n<|user|>:\nHi\n\n<|assistant|>\n"
+
+
+def test_initialize_chat_watsonx_reuses_model_inference(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(chat_models, "Credentials", MagicMock())
+    monkeypatch.setattr(
+        chat_models, "ModelInference", MagicMock(side_effect=lambda **_: MagicMock())
+    )
+    monkeypatch.setattr(chat_models, "_MODEL_CACHE", weakref.WeakValueDictionary())
+    kwargs = {
+        "model_id": MODEL_ID,
+        "url": "https://us-south.ml.cloud.ibm.com",
+        "apikey": "test_apikey",
+        "project_id": "test_project_id",
+    }
+
+    first = ChatWatsonx(**kwargs)
+    second = ChatWatsonx(**kwargs)
+    other_model = ChatWatsonx(**{**kwargs, "model_id": "ibm/granite-13b-chat-v2"})
+
+    assert first.watsonx_model is second.watsonx_model
+    assert first.watsonx_model is not other_model.watsonx_model
+    assert chat_models.ModelInference.call_count == 2
+
+    monkeypatch.setenv("WATSONX_DISABLE_MODEL_CACHE", "1")
+    uncached = ChatWatsonx(**kwargs)
+
+    assert uncached.watsonx_model is not first.watsonx_model
+    assert chat_models.ModelInference.call_count == 3
+    assert not any(
+        "test_apikey" in str(part) for key in chat_models._MODEL_CACHE for part in key
+    )
+
+    monkeypatch.delenv("WATSONX_DISABLE_MODEL_CACHE")
+    del first, second
+    gc.collect()
+    ChatWatsonx(**kwargs)
+
+    assert chat_models.ModelInference.call_count == 4
+
+
+def test_get_tool_prompt_follows_tools_list() -> None:
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_weather",
+                "description": "Get the weather",
+                "parameters": {"type": "object", "properties": {"city": {}}},
+            },
+        }
+    ]
+
+    tool_prompt = _get_tool_prompt(tools)
+
+    assert '"name":"get_weather"' in tool_prompt
+    assert _get_tool_prompt(list(tools)) == tool_prompt
+
+    tools.append(
+        {
+            "type": "function",
+            "function": {
+                "name": "get_time",
+                "description": "Get the time",
+                "parameters": {"type": "object", "properties": {}},
+            },
+        }
+    )
+
+    tool_prompt = _get_tool_prompt(tools)
+
+    assert '"name":"get_weather"' in tool_prompt
+    assert '"name":"get_time"' in tool_prompt
+
+
+def test_post_processing_tool_call_in_list() -> None:
+    message = _post_processing(
+        {"generated_text": '[{"name": "get_weather", "args": {"city": "Boston"}}]'},
+        "call-id",
+    )
+    assert isinstance(message, AIMessage)
+    assert [tool_call["name"] for tool_call in message.tool_calls] == ["get_weather"]
+
+
+def test_post_processing_json_without_tool_call() -> None:
+    raw_message = '{"answer": 42}'
+    message = _post_processing({"generated_text": raw_message}, "call-id")
+    assert isinstance(message, AIMessage)
+    assert message.content == raw_message
+    assert message.tool_calls == []
+
+
+def test_create_chat_prompt_default_model() -> None:
+    chat = ChatWatsonx.construct(model_id=MODEL_ID)
+    prompt = chat._create_chat_prompt(
+        [SystemMessage(content="Be brief"), HumanMessage(content="Hi")]
+    )
+    assert prompt == "System: Be brief\nHuman: Hi\nAI: "
+
+
+class GetWeather(BaseModel):
+    """Get the weather for a city."""
+
+    city: str = Field(description="The city name")
+
+
+@tool
+def get_time(city: str) -> str:
+    """Get the local time for a city."""
+    return "12:00"
+
+
+def test_bind_tools_returns_copies_of_cached_tool_definitions() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+    dict_tool = {
+        "type": "function",
+        "function": {
+            "name": "get_date",
+            "description": "Get the date",
+            "parameters": {"type": "object", "properties": {}},
+        },
+    }
+
+    first = chat.bind_tools([GetWeather, get_time, dict_tool])
+    second = chat.bind_tools([GetWeather, get_time, dict_tool])
+
+    first_tools = first.kwargs["tools"]  # type: ignore[attr-defined]
+    second_tools = second.kwargs["tools"]  # type: ignore[attr-defined]
+    assert [t["function"]["name"] for t in first_tools] == [
+        "GetWeather",
+        "get_time",
+        "get_date",
+    ]
+    assert first_tools == second_tools
+    assert chat_models._TOOL_CACHE[GetWeather] == first_tools[0]
+
+    first_tools[0]["function"]["name"] = "changed"
+    third = chat.bind_tools([GetWeather])
+
+    tools = third.kwargs["tools"]  # type: ignore[attr-defined]
+    assert tools[0]["function"]["name"] == "GetWeather"
+
+
+def test_bind_tools_converts_changed_base_tool_again() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+
+    @tool
+    def get_date(city: str) -> str:
+        """Get the date for a city."""
+        return "today"
+
+    first = chat.bind_tools([get_date])
+    assert chat.bind_tools([get_date]).kwargs == first.kwargs  # type: ignore[attr-defined]
+
+    get_date.description = "Get the local date for a city."
+    second = chat.bind_tools([get_date])
+
+    tools = second.kwargs["tools"]  # type: ignore[attr-defined]
+    assert tools[0]["function"]["description"] == "Get the local date for a city."
+
+
+def test_bind_tools_unsupported_model_warns() -> None:
+    chat = ChatWatsonx.construct(model_id=MODEL_ID)
+
+    with pytest.warns(UserWarning, match="bind_tools") as record:
+        bound = chat.bind_tools([GetWeather])
+
+    assert record[0].filename == __file__
+    tools = bound.kwargs["tools"]  # type: ignore[attr-defined]
+    assert [t["function"]["name"] for t in tools] == ["GetWeather"]
+
+
+def test_with_structured_output_unsupported_model_warns() -> None:
+    chat = ChatWatsonx.construct(model_id=MODEL_ID)
+
+    with pytest.warns(UserWarning, match="bind_tools") as record:
+        chat.with_structured_output(GetWeather)
+
+    assert record[0].filename == __file__
+
+
+def test_with_structured_output_is_cached_per_schema() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+
+    structured_chat = chat.with_structured_output(GetWeather)
+
+    assert chat.with_structured_output(GetWeather) is structured_chat
+    raw_structured_chat = chat.with_structured_output(GetWeather, include_raw=True)
+    assert raw_structured_chat is not structured_chat
+    assert chat.copy().with_structured_output(GetWeather) is not structured_chat
+
+
+def test_with_structured_output_is_not_cached_for_dict_schema() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+    schema = {
+        "title": "GetWeather",
+        "description": "Get the current weather in a given location",
+        "type": "object",
+        "properties": {"location": {"type": "string"}},
+    }
+
+    structured_chat = chat.with_structured_output(schema)
+    schema["title"] = "GetTime"
+
+    assert chat.with_structured_output(schema) is not structured_chat
+    assert not chat._structured_output_cache
+
+
+def test_with_structured_output_include_raw_parsing_error() -> None:
+    raw_message = '{"name": "GetWeather", "args": {"town": "Boston"}}'
+    watsonx_model = MagicMock()
+    watsonx_model.generate.return_value = {
+        "results": [{"generated_text": raw_message, "stop_reason": "eos_token"}]
+    }
+    chat = ChatWatsonx.construct(
+        model_id="meta-llama/llama-3-1-70b-instruct", watsonx_model=watsonx_model
+    )
+
+    result = chat.with_structured_output(GetWeather, include_raw=True).invoke("Hi")
+
+    assert isinstance(result, dict)
+    assert result["raw"].tool_calls[0]["args"] == {"town": "Boston"}
+    assert result["parsed"] is None
+    assert result["parsing_error"] is not None
+
+
+async def test_with_structured_output_include_raw_ainvoke() -> None:
+    raw_message = '{"name": "GetWeather", "args": {"city": "Boston"}}'
+    watsonx_model = MagicMock()
+    watsonx_model.generate.return_value = {
+        "results": [{"generated_text": raw_message, "stop_reason": "eos_token"}]
+    }
+    chat = ChatWatsonx.construct(
+        model_id="meta-llama/llama-3-1-70b-instruct", watsonx_model=watsonx_model
+    )
+    structured_chat = chat.with_structured_output(GetWeather, include_raw=True)
+
+    result = await structured_chat.ainvoke("Hi")
+
+    assert isinstance(result, dict)
+    assert isinstance(result["raw"], AIMessage)
+    assert result["parsed"] == GetWeather(city="Boston")
+    assert result["parsing_error"] is None
+    assert await chat.with_structured_output(GetWeather).ainvoke("Hi") == (
+        GetWeather(city="Boston")
+    )
+
+
+def test_with_structured_output_passes_stop_to_model() -> None:
+    raw_message = '{"name": "GetWeather", "args": {"city": "Boston"}}'
+    watsonx_model = MagicMock()
+    watsonx_model.generate.return_value = {
+        "results": [{"generated_text": raw_message, "stop_reason": "eos_token"}]
+    }
+    chat = ChatWatsonx.construct(
+        model_id="meta-llama/llama-3-1-70b-instruct", watsonx_model=watsonx_model
+    )
+
+    result = chat.with_structured_output(GetWeather).invoke("Hi", stop=["\n"])
+
+    assert result == GetWeather(city="Boston")
+    params = watsonx_model.generate.call_args.kwargs["params"]
+    assert params["stop_sequences"] == ["\n"]
+
+
+def test_with_structured_output_unknown_method() -> None:
+    chat = ChatWatsonx.construct(model_id="meta-llama/llama-3-1-70b-instruct")
+
+    with pytest.raises(ValueError, match="Unrecognized method argument"):
+        chat.with_structured_output(GetWeather, method="xml")  # type: ignore[arg-type]
+
+
+def test_get_tool_prompt_collapses_whitespace_in_descriptions() -> None:
+    tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_weather",
+                "description": "Get   the\n  weather",
+                "parameters": {"type": "object", "properties": {}},
+            },
+        }
+    ]
+
+    assert '"description":"Get the\\n weather"' in _get_tool_prompt(tools)